@@ -5,15 +5,21 @@ from pathlib import Path
 
 from lark import Lark
 
-from src.ast_builder import ASTBuilder
+from src.ast_builder import AST_BUILDER
 from src.ast_nodes import Program
 from src.interpreter import Interpreter
 
-
-def load_grammar() -> str:
-    """Load the grammar file."""
-    with open("grammar.lark") as f:
-        return f.read()
+# Built once at import. Lark caches the LALR tables on disk, keyed on the
+# grammar, so later runs skip the table construction entirely. The AST
+# builders run inline as rules are reduced, so parsing returns the AST
+# directly without building an intermediate parse tree.
+PARSER = Lark(
+    (Path(__file__).parent / "grammar.lark").read_text(),
+    start="program",
+    parser="lalr",
+    cache=True,
+    transformer=AST_BUILDER,
+)
 
 
 def run_toy_file(file_path: str) -> None:
@@ -36,23 +42,13 @@ def run_toy_file(file_path: str) -> None:
         print(f"Error reading file '{file_path}': {e}", file=sys.stderr)
         sys.exit(1)
 
-    # Parse the source code
+    # Parse the source code into an AST
     try:
-        grammar = load_grammar()
-        parser = Lark(grammar, start="program")
-        parse_tree = parser.parse(code)
+        ast = PARSER.parse(code)
     except Exception as e:
         print(f"Parse error: {e}", file=sys.stderr)
         sys.exit(1)
 
-    # Build AST
-    try:
-        ast_builder = ASTBuilder()
-        ast = ast_builder.transform(parse_tree)
-    except Exception as e:
-        print(f"AST build error: {e}", file=sys.stderr)
-        sys.exit(1)
-
     # Interpret
     try:
         interpreter = Interpreter()
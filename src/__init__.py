@@ -1,7 +1,7 @@
 """Toy Language interpreter package."""
 
-__all__ = ["ASTBuilder", "Interpreter", "Program"]
+__all__ = ["AST_BUILDER", "Interpreter", "Program"]
 
-from .ast_builder import ASTBuilder
+from .ast_builder import AST_BUILDER
 from .ast_nodes import Program
 from .interpreter import Interpreter
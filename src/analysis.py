@@ -0,0 +1,316 @@
+"""Static analyses over the resolved AST.
+
+These checks decide which parts of a program can be handed to an
+optimized execution path without changing what the program does.
+"""
+
+import math
+from collections import Counter
+from dataclasses import fields
+
+from .ast_nodes import (
+    GLOBAL,
+    AddOp,
+    Assignment,
+    ASTNode,
+    Block,
+    DivOp,
+    EqOp,
+    FunctionCall,
+    FunctionDef,
+    GtOp,
+    IfStatement,
+    LtOp,
+    MulOp,
+    NeqOp,
+    Number,
+    NumpyReductionNode,
+    Program,
+    Reduction,
+    ReturnStatement,
+    SubOp,
+    UnaryOp,
+    Upvalue,
+    VarDeclaration,
+    Variable,
+    WhileStatement,
+)
+
+ARITHMETIC_OPS = (AddOp, SubOp, MulOp, DivOp)
+COMPARISON_OPS = (LtOp, GtOp, EqOp, NeqOp)
+
+# Integer-valued floats up to this size add without rounding, with room for a step
+EXACT_INTEGER_LIMIT = 2.0**52
+
+
+def count_bindings(statements: list[ASTNode], counts: Counter[str] | None = None) -> Counter[str]:
+    """Count the declarations and assignments of each name, at any depth."""
+    if counts is None:
+        counts = Counter()
+    for statement in statements:
+        if isinstance(statement, (VarDeclaration, Assignment)):
+            counts[statement.name] += 1
+        elif isinstance(statement, FunctionDef):
+            counts[statement.name] += 1
+            count_bindings(statement.body.statements, counts)
+        elif isinstance(statement, Block):
+            count_bindings(statement.statements, counts)
+        elif isinstance(statement, IfStatement):
+            count_bindings(statement.then_block.statements, counts)
+            if statement.else_block:
+                count_bindings(statement.else_block.statements, counts)
+        elif isinstance(statement, WhileStatement):
+            count_bindings(statement.body.statements, counts)
+        elif isinstance(statement, NumpyReductionNode):
+            count_bindings(statement.loop.body.statements, counts)
+    return counts
+
+
+def count_nodes(node: ASTNode) -> int:
+    """Count a node and all the nodes below it."""
+    total = 1
+    for field in fields(node):
+        value = getattr(node, field.name)
+        if isinstance(value, ASTNode):
+            total += count_nodes(value)
+        elif isinstance(value, list):
+            total += sum(count_nodes(item) for item in value if isinstance(item, ASTNode))
+    return total
+
+
+def always_returns(statements: list[ASTNode]) -> bool:
+    """Check whether every path through the statements ends in a return."""
+    for statement in statements:
+        if isinstance(statement, ReturnStatement):
+            return True
+        if isinstance(statement, Block) and always_returns(statement.statements):
+            return True
+        if (
+            isinstance(statement, IfStatement)
+            and statement.else_block
+            and always_returns(statement.then_block.statements)
+            and always_returns(statement.else_block.statements)
+        ):
+            return True
+    return False
+
+
+class NumericFunctionChecker:
+    """Decides whether a function only ever computes with numbers.
+
+    Such a function uses only its parameters and locals, number literals,
+    arithmetic, comparisons as if/while conditions, and calls to itself,
+    and returns a number on every path. Given numeric arguments it can
+    only produce a number, so it can be compiled to native code.
+    """
+
+    def __init__(self, node: FunctionDef, bindings: Counter[str]) -> None:
+        self._node = node
+        self._bindings = bindings
+
+    def check(self) -> bool:
+        """Run the analysis."""
+        node = self._node
+        # Self-calls are compiled as direct calls, so the global name must
+        # never refer to anything but this definition
+        if node.slot != GLOBAL or self._bindings[node.name] != 1:
+            return False
+        # A repeated parameter name binds the last argument, which a native
+        # signature can't express
+        if len(set(node.parameters)) != len(node.parameters):
+            return False
+        statements = node.body.statements
+        return self._statements(statements, set(node.parameters)) and always_returns(statements)
+
+    def _statements(self, statements: list[ASTNode], assigned: set[str]) -> bool:
+        """Check statements, tracking the locals definitely assigned so far."""
+        for statement in statements:
+            if isinstance(statement, VarDeclaration):
+                if not self._expression(statement.value, assigned):
+                    return False
+                assigned.add(statement.name)
+
+            elif isinstance(statement, Assignment):
+                if statement.name not in assigned or not self._expression(
+                    statement.value, assigned
+                ):
+                    return False
+
+            elif isinstance(statement, ReturnStatement):
+                if statement.value is None or not self._expression(statement.value, assigned):
+                    return False
+
+            elif isinstance(statement, Block):
+                if not self._statements(statement.statements, assigned):
+                    return False
+
+            elif isinstance(statement, IfStatement):
+                if not self._condition(statement.condition, assigned):
+                    return False
+                then_assigned = set(assigned)
+                if not self._statements(statement.then_block.statements, then_assigned):
+                    return False
+                if statement.else_block:
+                    else_assigned = set(assigned)
+                    if not self._statements(statement.else_block.statements, else_assigned):
+                        return False
+                    assigned |= then_assigned & else_assigned
+
+            elif isinstance(statement, (WhileStatement, NumpyReductionNode)):
+                if isinstance(statement, NumpyReductionNode):
+                    statement = statement.loop
+                if not self._condition(statement.condition, assigned):
+                    return False
+                if not self._statements(statement.body.statements, set(assigned)):
+                    return False
+
+            else:
+                return False
+        return True
+
+    def _condition(self, node: ASTNode, assigned: set[str]) -> bool:
+        """Check an if/while condition, which must be a numeric comparison."""
+        return (
+            isinstance(node, COMPARISON_OPS)
+            and self._expression(node.left, assigned)
+            and self._expression(node.right, assigned)
+        )
+
+    def _expression(self, node: ASTNode, assigned: set[str]) -> bool:
+        """Check that an expression always evaluates to a number."""
+        if isinstance(node, Number):
+            return math.isfinite(node.value)
+        if isinstance(node, Variable):
+            return node.depth == 0 and node.name in assigned
+        if isinstance(node, ARITHMETIC_OPS):
+            return self._expression(node.left, assigned) and self._expression(node.right, assigned)
+        if isinstance(node, UnaryOp):
+            return node.operator == "-" and self._expression(node.operand, assigned)
+        if isinstance(node, FunctionCall):
+            return (
+                node.name == self._node.name
+                and node.depth == GLOBAL
+                and len(node.arguments) == len(self._node.parameters)
+                and all(self._expression(argument, assigned) for argument in node.arguments)
+            )
+        return False
+
+
+def mark_numeric_functions(program: Program) -> None:
+    """Flag the top-level functions that NumericFunctionChecker accepts."""
+    bindings = count_bindings(program.statements)
+    for statement in program.statements:
+        if isinstance(statement, FunctionDef):
+            statement.numeric = NumericFunctionChecker(statement, bindings).check()
+            if statement.numeric:
+                statement.body_size = count_nodes(statement.body)
+
+
+def _is_variable(node: ASTNode, name: str) -> bool:
+    """Check whether a node is a reference to the given name."""
+    return isinstance(node, Variable) and node.name == name
+
+
+def _counter_step(node: Assignment, counter: str) -> float | None:
+    """Return the step of ``counter = counter + step``, or None for any other statement."""
+    value = node.value
+    if node.name != counter or not isinstance(value, AddOp):
+        return None
+    if isinstance(value.right, Number) and _is_variable(value.left, counter):
+        step = value.right.value
+    elif isinstance(value.left, Number) and _is_variable(value.right, counter):
+        step = value.left.value
+    else:
+        return None
+    # A whole, positive step keeps the counter exact, so the number of
+    # iterations can be computed up front
+    return step if step.is_integer() and 0 < step <= EXACT_INTEGER_LIMIT else None
+
+
+def _accumulation(node: Assignment) -> tuple[Reduction, ASTNode] | None:
+    """Split ``acc = acc op term`` (or ``term op acc``) into its reduction and term."""
+    value = node.value
+    if isinstance(value, AddOp):
+        reduction = Reduction.SUM
+    elif isinstance(value, MulOp):
+        reduction = Reduction.PRODUCT
+    else:
+        return None
+    # Float addition and multiplication are commutative, so either side works
+    if _is_variable(value.left, node.name):
+        return reduction, value.right
+    if _is_variable(value.right, node.name):
+        return reduction, value.left
+    return None
+
+
+def _is_counter_term(node: ASTNode, counter: str) -> bool:
+    """Check that an expression is arithmetic on the counter and number literals."""
+    if isinstance(node, Number):
+        return True
+    if isinstance(node, Variable):
+        return node.name == counter
+    if isinstance(node, DivOp):
+        # A zero divisor has to raise on the right iteration, so leave it to the loop
+        return (
+            isinstance(node.right, Number)
+            and node.right.value != 0
+            and _is_counter_term(node.left, counter)
+        )
+    if isinstance(node, (AddOp, SubOp, MulOp)):
+        return _is_counter_term(node.left, counter) and _is_counter_term(node.right, counter)
+    if isinstance(node, UnaryOp):
+        return node.operator == "-" and _is_counter_term(node.operand, counter)
+    return False
+
+
+def match_reduction(node: WhileStatement) -> NumpyReductionNode | None:
+    """Recognize a resolved while loop that computes a sum or product over a counter."""
+    condition = node.condition
+    statements = node.body.statements
+    if (
+        not isinstance(condition, LtOp)
+        or not isinstance(condition.left, Variable)
+        or len(statements) != 2
+    ):
+        return None
+    counter = condition.left.name
+    bound = condition.right
+
+    first, second = statements
+    if not isinstance(first, Assignment) or not isinstance(second, Assignment):
+        return None
+    # The counter update may come before or after the accumulation
+    counter_first = _counter_step(first, counter) is not None
+    update, accumulate = (first, second) if counter_first else (second, first)
+    step = _counter_step(update, counter)
+    if step is None:
+        return None
+
+    accumulation = _accumulation(accumulate)
+    if accumulation is None or accumulate.name == counter:
+        return None
+    reduction, term = accumulation
+    if not _is_counter_term(term, counter):
+        return None
+    # The bound is evaluated once, so the loop body must not be able to change it
+    if not isinstance(bound, (Number, Variable, Upvalue)) or (
+        isinstance(bound, (Variable, Upvalue)) and bound.name in (counter, accumulate.name)
+    ):
+        return None
+
+    return NumpyReductionNode(
+        loop=node,
+        counter=Variable(name=counter, depth=update.depth, slot=update.slot, outer=update.outer),
+        bound=bound,
+        step=step,
+        accumulator=Variable(
+            name=accumulate.name,
+            depth=accumulate.depth,
+            slot=accumulate.slot,
+            outer=accumulate.outer,
+        ),
+        reduction=reduction,
+        term=term,
+        counter_first=counter_first,
+    )
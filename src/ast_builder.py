@@ -1,144 +1,269 @@
 """AST Builder for the Toy Language.
 
-This module transforms the parse tree from Lark into our AST nodes.
+This module builds our AST nodes as Lark parses a program. Each rule and
+token is built by a plain function looked up in a table.
 """
 
+from collections.abc import Callable
+from sys import intern
+from types import SimpleNamespace
 from typing import cast
 
-from lark import Token, Transformer
+from lark import Token
 
 from .ast_nodes import (
+    AddOp,
     Assignment,
     ASTNode,
-    BinaryOp,
     Block,
     Boolean,
-    ExpressionStatement,
+    DivOp,
+    EqOp,
     FunctionCall,
     FunctionDef,
+    GtOp,
     IfStatement,
+    LtOp,
+    MulOp,
+    NeqOp,
     Nil,
     Number,
     Program,
     ReturnStatement,
     String,
+    SubOp,
+    TailCall,
     UnaryOp,
     VarDeclaration,
     Variable,
     WhileStatement,
 )
 
-# Type alias for items that come from the parser (can be tokens or transformed nodes)
-TransformerItem = Token | ASTNode
+# Type alias for built children: AST nodes, tokens without a handler, and
+# the lists built for parameters and arguments
+BuildItem = ASTNode | Token | list[str] | list[ASTNode]
 
+# Literal nodes whose values can be compared at parse time
+LITERALS = (Number, String, Boolean, Nil)
 
-class ASTBuilder(Transformer[Token, ASTNode]):
-    """Transforms the parse tree from Lark into our AST nodes."""
 
-    def _extract_name(self, item: TransformerItem) -> str:
-        """Extract string name from a Variable node or Token."""
-        return item.name if isinstance(item, Variable) else str(item)
+def _literal_value(node: Number | String | Boolean | Nil) -> float | str | bool | None:
+    """Return the runtime value of a literal node."""
+    return None if isinstance(node, Nil) else node.value
 
-    def program(self, items: list[ASTNode]) -> Program:
-        return Program(statements=items)
 
-    def var_declaration(self, items: list[TransformerItem]) -> VarDeclaration:
-        name = self._extract_name(items[0])
-        value = cast(ASTNode, items[1])
-        return VarDeclaration(name=name, value=value)
+def _extract_name(item: BuildItem) -> str:
+    """Extract string name from a Variable node or Token."""
+    return item.name if isinstance(item, Variable) else intern(str(item))
 
-    def assignment(self, items: list[TransformerItem]) -> Assignment:
-        name = self._extract_name(items[0])
-        value = cast(ASTNode, items[1])
-        return Assignment(name=name, value=value)
 
-    def function_def(self, items: list[TransformerItem]) -> FunctionDef:
-        name = self._extract_name(items[0])
-        if len(items) == 3:  # name, parameters, body
-            parameters = cast(list[str], items[1])
-            body = cast(Block, items[2])
-        else:  # name, body (no parameters)
-            parameters = []
-            body = cast(Block, items[1])
-        return FunctionDef(name=name, parameters=parameters, body=body)
+def _program(items: list[BuildItem]) -> Program:
+    return Program(statements=cast(list[ASTNode], items))
 
-    def parameters(self, items: list[TransformerItem]) -> list[str]:
-        """Extract parameter names from Variable nodes or Tokens."""
-        return [self._extract_name(item) for item in items]
 
-    def block(self, items: list[ASTNode]) -> Block:
-        return Block(statements=items)
+def _var_declaration(items: list[BuildItem]) -> VarDeclaration:
+    name = _extract_name(items[0])
+    value = cast(ASTNode, items[1])
+    return VarDeclaration(name=name, value=value)
 
-    def return_statement(self, items: list[TransformerItem]) -> ReturnStatement:
-        value = cast(ASTNode, items[0]) if items else None
-        return ReturnStatement(value=value)
 
-    def if_statement(self, items: list[TransformerItem]) -> IfStatement:
-        condition = cast(ASTNode, items[0])
-        then_block = cast(Block, items[1])
-        else_block = cast(Block, items[2]) if len(items) > 2 else None
-        return IfStatement(condition=condition, then_block=then_block, else_block=else_block)
+def _assignment(items: list[BuildItem]) -> Assignment:
+    name = _extract_name(items[0])
+    value = cast(ASTNode, items[1])
+    return Assignment(name=name, value=value)
 
-    def while_statement(self, items: list[TransformerItem]) -> WhileStatement:
-        condition = cast(ASTNode, items[0])
+
+def _function_def(items: list[BuildItem]) -> FunctionDef:
+    name = _extract_name(items[0])
+    if len(items) == 3:  # name, parameters, body
+        parameters = cast(list[str], items[1])
+        body = cast(Block, items[2])
+    else:  # name, body (no parameters)
+        parameters = []
         body = cast(Block, items[1])
-        return WhileStatement(condition=condition, body=body)
+    return FunctionDef(name=name, parameters=parameters, body=body)
+
+
+def _parameters(items: list[BuildItem]) -> list[str]:
+    """Extract parameter names from Variable nodes or Tokens."""
+    return [_extract_name(item) for item in items]
+
+
+def _block(items: list[BuildItem]) -> Block:
+    return Block(statements=cast(list[ASTNode], items))
+
+
+def _return_statement(items: list[BuildItem]) -> ReturnStatement:
+    value = cast(ASTNode, items[0]) if items else None
+    if type(value) is FunctionCall:
+        value = TailCall(name=value.name, arguments=value.arguments)
+    return ReturnStatement(value=value)
+
+
+def _if_statement(items: list[BuildItem]) -> IfStatement:
+    condition = cast(ASTNode, items[0])
+    then_block = cast(Block, items[1])
+    else_block = cast(Block, items[2]) if len(items) > 2 else None
+    return IfStatement(condition=condition, then_block=then_block, else_block=else_block)
+
+
+def _while_statement(items: list[BuildItem]) -> WhileStatement:
+    condition = cast(ASTNode, items[0])
+    body = cast(Block, items[1])
+    return WhileStatement(condition=condition, body=body)
+
+
+def _expression_statement(items: list[BuildItem]) -> ASTNode:
+    # The expression stands as the statement itself; blocks discard its value
+    return cast(ASTNode, items[0])
+
+
+# Binary operations - named rules from grammar.
+# Operations on literals are folded into a literal where the result is
+# known at parse time; anything that could fail is left for runtime.
+def _eq(items: list[BuildItem]) -> ASTNode:
+    left, right = cast(list[ASTNode], items)
+    if isinstance(left, LITERALS) and isinstance(right, LITERALS):
+        return Boolean(value=_literal_value(left) == _literal_value(right))
+    return EqOp(operator="==", left=left, right=right)
+
+
+def _neq(items: list[BuildItem]) -> ASTNode:
+    left, right = cast(list[ASTNode], items)
+    if isinstance(left, LITERALS) and isinstance(right, LITERALS):
+        return Boolean(value=_literal_value(left) != _literal_value(right))
+    return NeqOp(operator="!=", left=left, right=right)
+
+
+def _lt(items: list[BuildItem]) -> ASTNode:
+    left, right = cast(list[ASTNode], items)
+    if isinstance(left, Number) and isinstance(right, Number):
+        return Boolean(value=left.value < right.value)
+    return LtOp(operator="<", left=left, right=right)
+
+
+def _gt(items: list[BuildItem]) -> ASTNode:
+    left, right = cast(list[ASTNode], items)
+    if isinstance(left, Number) and isinstance(right, Number):
+        return Boolean(value=left.value > right.value)
+    return GtOp(operator=">", left=left, right=right)
+
+
+def _add(items: list[BuildItem]) -> ASTNode:
+    left, right = cast(list[ASTNode], items)
+    if isinstance(left, Number) and isinstance(right, Number):
+        return Number(value=left.value + right.value)
+    if isinstance(left, String) and isinstance(right, String):
+        return String(value=left.value + right.value)
+    return AddOp(operator="+", left=left, right=right)
+
+
+def _sub(items: list[BuildItem]) -> ASTNode:
+    left, right = cast(list[ASTNode], items)
+    if isinstance(left, Number) and isinstance(right, Number):
+        return Number(value=left.value - right.value)
+    return SubOp(operator="-", left=left, right=right)
+
+
+def _mul(items: list[BuildItem]) -> ASTNode:
+    left, right = cast(list[ASTNode], items)
+    if isinstance(left, Number) and isinstance(right, Number):
+        return Number(value=left.value * right.value)
+    return MulOp(operator="*", left=left, right=right)
 
-    def expression_statement(self, items: list[TransformerItem]) -> ExpressionStatement:
-        return ExpressionStatement(expression=cast(ASTNode, items[0]))
 
-    # Binary operations - named rules from grammar
-    def eq(self, items: list[ASTNode]) -> BinaryOp:
-        return BinaryOp(operator="==", left=items[0], right=items[1])
+def _div(items: list[BuildItem]) -> ASTNode:
+    left, right = cast(list[ASTNode], items)
+    # Division by zero is reported at runtime
+    if isinstance(left, Number) and isinstance(right, Number) and right.value != 0:
+        return Number(value=left.value / right.value)
+    return DivOp(operator="/", left=left, right=right)
 
-    def neq(self, items: list[ASTNode]) -> BinaryOp:
-        return BinaryOp(operator="!=", left=items[0], right=items[1])
 
-    def lt(self, items: list[ASTNode]) -> BinaryOp:
-        return BinaryOp(operator="<", left=items[0], right=items[1])
+# Unary operations
+def _neg(items: list[BuildItem]) -> ASTNode:
+    operand = cast(ASTNode, items[0])
+    if isinstance(operand, Number):
+        return Number(value=-operand.value)
+    return UnaryOp(operator="-", operand=operand)
 
-    def gt(self, items: list[ASTNode]) -> BinaryOp:
-        return BinaryOp(operator=">", left=items[0], right=items[1])
 
-    def add(self, items: list[ASTNode]) -> BinaryOp:
-        return BinaryOp(operator="+", left=items[0], right=items[1])
+def _function_call(items: list[BuildItem]) -> FunctionCall:
+    name = _extract_name(items[0])
+    arguments = cast(list[ASTNode], items[1]) if len(items) > 1 else []
+    return FunctionCall(name=name, arguments=arguments)
 
-    def sub(self, items: list[ASTNode]) -> BinaryOp:
-        return BinaryOp(operator="-", left=items[0], right=items[1])
 
-    def mul(self, items: list[ASTNode]) -> BinaryOp:
-        return BinaryOp(operator="*", left=items[0], right=items[1])
+def _arguments(items: list[BuildItem]) -> list[ASTNode]:
+    return cast(list[ASTNode], items)
 
-    def div(self, items: list[ASTNode]) -> BinaryOp:
-        return BinaryOp(operator="/", left=items[0], right=items[1])
 
-    # Unary operations
-    def neg(self, items: list[ASTNode]) -> UnaryOp:
-        return UnaryOp(operator="-", operand=items[0])
+def _nil(items: list[BuildItem]) -> Nil:
+    return Nil()
 
-    def function_call(self, items: list[TransformerItem]) -> FunctionCall:
-        name = self._extract_name(items[0])
-        arguments = cast(list[ASTNode], items[1]) if len(items) > 1 else []
-        return FunctionCall(name=name, arguments=arguments)
 
-    def arguments(self, items: list[ASTNode]) -> list[ASTNode]:
-        return items
+def _number(token: Token) -> Number:
+    value = float(str(token))
+    return Number(value=value)
 
-    def NUMBER(self, token: Token) -> Number:
-        value = float(str(token))
-        return Number(value=value)
 
-    def STRING(self, token: Token) -> String:
-        # Remove quotes from string
-        string_value = str(token)[1:-1]
-        return String(value=string_value)
+def _string(token: Token) -> String:
+    # Remove quotes from string
+    string_value = str(token)[1:-1]
+    if "\\" in string_value:
+        # Resolve escape sequences once, here, rather than each time the
+        # string is printed. Non-ASCII text passes through unchanged.
+        string_value = string_value.encode("latin-1", "backslashreplace").decode("unicode_escape")
+    return String(value=string_value)
+
 
-    def BOOLEAN(self, token: Token) -> Boolean:
-        value = str(token) == "true"
-        return Boolean(value=value)
+def _boolean(token: Token) -> Boolean:
+    value = str(token) == "true"
+    return Boolean(value=value)
+
+
+def _name(token: Token) -> Variable:
+    # Interned so every occurrence of an identifier is the same string object
+    return Variable(name=intern(str(token)))
 
-    def nil(self, items: list[TransformerItem]) -> Nil:
-        return Nil()
 
-    def NAME(self, token: Token) -> Variable:
-        return Variable(name=str(token))
+# Builder for each grammar rule, keyed by rule name (or alias)
+RULE_TABLE: dict[str, Callable[[list[BuildItem]], BuildItem]] = {
+    "program": _program,
+    "var_declaration": _var_declaration,
+    "assignment": _assignment,
+    "function_def": _function_def,
+    "parameters": _parameters,
+    "block": _block,
+    "return_statement": _return_statement,
+    "if_statement": _if_statement,
+    "while_statement": _while_statement,
+    "expression_statement": _expression_statement,
+    "eq": _eq,
+    "neq": _neq,
+    "lt": _lt,
+    "gt": _gt,
+    "add": _add,
+    "sub": _sub,
+    "mul": _mul,
+    "div": _div,
+    "neg": _neg,
+    "function_call": _function_call,
+    "arguments": _arguments,
+    "nil": _nil,
+}
+
+# Builder for each terminal that becomes a node; other tokens pass through
+TOKEN_TABLE: dict[str, Callable[[Token], ASTNode]] = {
+    "NUMBER": _number,
+    "STRING": _string,
+    "BOOLEAN": _boolean,
+    "NAME": _name,
+}
+
+
+# The builders as attributes, which is how Lark looks up the callbacks of an
+# inline transformer. Passed as ``transformer=`` to an LALR parser, they run
+# as each rule is reduced and each token is lexed, so parsing returns the AST
+# without building a parse tree first.
+AST_BUILDER = SimpleNamespace(**RULE_TABLE, **TOKEN_TABLE)
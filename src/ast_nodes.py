@@ -1,9 +1,20 @@
 """AST Node definitions for the Toy Language interpreter."""
 
-from dataclasses import dataclass
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any
 
+# Scope depth / slot index of a name that lives in the global environment
+GLOBAL = -1
 
-@dataclass
+# (depth, slot) of each declaration of a name in functions further out than
+# the nearest one, innermost first. A reference falls back to them, and then
+# to the globals, while the nearer declarations have not run yet.
+Outer = tuple[tuple[int, int], ...]
+
+
+@dataclass(slots=True)
 class ASTNode:
     """Base class for all AST nodes."""
 
@@ -11,101 +22,222 @@ class ASTNode:
 
 
 # Literals and values
-@dataclass
+@dataclass(slots=True)
 class Number(ASTNode):
     value: float
 
 
-@dataclass
+@dataclass(slots=True)
 class String(ASTNode):
     value: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Boolean(ASTNode):
     value: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class Nil(ASTNode):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Variable(ASTNode):
     name: str
+    # Filled in by the resolver
+    depth: int = GLOBAL
+    slot: int = GLOBAL
+    outer: Outer = ()
+
+
+# A read of a variable declared in an enclosing function, through the
+# current function's table of captured (environment, slot) pairs
+@dataclass(slots=True)
+class Upvalue(ASTNode):
+    name: str
+    index: int
+    outer: Outer = ()  # Depths relative to the current function's environment
 
 
 # Binary operations
-@dataclass
+@dataclass(slots=True)
 class BinaryOp(ASTNode):
     operator: str
     left: ASTNode
     right: ASTNode
 
 
+# One subclass per operator, so the interpreter can dispatch on node type alone
+@dataclass(slots=True)
+class AddOp(BinaryOp):
+    pass
+
+
+@dataclass(slots=True)
+class SubOp(BinaryOp):
+    pass
+
+
+@dataclass(slots=True)
+class MulOp(BinaryOp):
+    pass
+
+
+@dataclass(slots=True)
+class DivOp(BinaryOp):
+    pass
+
+
+@dataclass(slots=True)
+class LtOp(BinaryOp):
+    pass
+
+
+@dataclass(slots=True)
+class GtOp(BinaryOp):
+    pass
+
+
+@dataclass(slots=True)
+class EqOp(BinaryOp):
+    pass
+
+
+@dataclass(slots=True)
+class NeqOp(BinaryOp):
+    pass
+
+
 # Unary operations
-@dataclass
+@dataclass(slots=True)
 class UnaryOp(ASTNode):
     operator: str
     operand: ASTNode
 
 
 # Statements
-@dataclass
+@dataclass(slots=True)
 class VarDeclaration(ASTNode):
     name: str
     value: ASTNode
+    slot: int = GLOBAL
 
 
-@dataclass
+@dataclass(slots=True)
 class Assignment(ASTNode):
     name: str
     value: ASTNode
+    depth: int = GLOBAL
+    slot: int = GLOBAL
+    outer: Outer = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class Block(ASTNode):
     statements: list[ASTNode]
 
 
-@dataclass
+@dataclass(slots=True)
 class IfStatement(ASTNode):
     condition: ASTNode
     then_block: Block
     else_block: Block | None
 
 
-@dataclass
+@dataclass(slots=True)
 class WhileStatement(ASTNode):
     condition: ASTNode
     body: Block
 
 
-@dataclass
-class ReturnStatement(ASTNode):
-    value: ASTNode | None
+class Reduction(Enum):
+    """How a reduction loop combines each term into its accumulator."""
+
+    SUM = "+"
+    PRODUCT = "*"
 
 
-@dataclass
-class ExpressionStatement(ASTNode):
-    expression: ASTNode
+# A while loop that analysis recognized as a counted reduction:
+#     while (counter < bound) { counter = counter + step; acc = acc op term; }
+# with the two assignments in either order. Run with NumPy when the values
+# allow it, and as the original loop otherwise.
+@dataclass(slots=True)
+class NumpyReductionNode(ASTNode):
+    loop: WhileStatement
+    counter: Variable
+    bound: ASTNode
+    step: float
+    accumulator: Variable
+    reduction: Reduction
+    term: ASTNode  # Depends only on the counter
+    counter_first: bool  # Whether the term sees the counter after it is stepped
+
+
+@dataclass(slots=True)
+class ReturnStatement(ASTNode):
+    value: ASTNode | None
 
 
 # Functions
-@dataclass
+@dataclass(slots=True)
 class FunctionDef(ASTNode):
     name: str
     parameters: list[str]
     body: Block
+    slot: int = GLOBAL
+    num_slots: int = 0  # Size of the function's own scope, parameters first
+    numeric: bool = False  # Set by analysis when the function can be compiled natively
+    body_size: int = 0  # Number of nodes in the body, set by analysis for numeric functions
+    # (depth, slot) from the defining scope of each variable read as an Upvalue
+    upvalues: list[tuple[int, int]] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionCall(ASTNode):
     name: str
     arguments: list[ASTNode]
+    depth: int = GLOBAL
+    slot: int = GLOBAL
+    outer: Outer = ()
+
+
+# A call in return position, which reuses the caller's frame
+@dataclass(slots=True)
+class TailCall(FunctionCall):
+    pass
+
+
+# Calls with a small fixed number of arguments, which the interpreter
+# evaluates into locals instead of building an argument list
+@dataclass(slots=True)
+class Call0(FunctionCall):
+    pass
+
+
+@dataclass(slots=True)
+class Call1(FunctionCall):
+    pass
+
+
+@dataclass(slots=True)
+class Call2(FunctionCall):
+    pass
+
+
+@dataclass(slots=True)
+class Call3(FunctionCall):
+    pass
+
+
+# A call the resolver bound directly to a built-in function
+@dataclass(slots=True)
+class BuiltinCall(ASTNode):
+    name: str
+    func: Callable[..., Any]
+    arguments: list[ASTNode]
 
 
-@dataclass
+@dataclass(slots=True)
 class Program(ASTNode):
     statements: list[ASTNode]
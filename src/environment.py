@@ -1,32 +1,57 @@
 """Environment for variable and function scoping."""
 
 from collections.abc import Callable
-from typing import Optional, Union
+from enum import Enum
+from sys import intern
+from typing import Final, Optional, Union, cast
 
-from .ast_nodes import Block
+from .ast_nodes import ASTNode, Block
 
 # Type alias for runtime values (includes built-in functions as callables)
 RuntimeValue = Union[float, str, bool, None, "Function", Callable[..., "RuntimeValue"]]
 
 
-class ReturnException(Exception):
-    """Exception used to implement return statements."""
+class _Unset(Enum):
+    """Marker type for slots whose variable has not been declared yet."""
 
-    def __init__(self, value: RuntimeValue) -> None:
-        self.value = value
-        super().__init__()
+    UNSET = "unset"
+
+
+UNSET: Final = _Unset.UNSET
+
+# A slot holds a runtime value, or UNSET until its declaration has run
+SlotValue = RuntimeValue | _Unset
 
 
 class Environment:
     """Represents a variable scope with support for nested scopes."""
 
-    def __init__(self, parent: Optional["Environment"] = None) -> None:
+    def __init__(self, parent: Optional["Environment"] = None, num_slots: int = 0) -> None:
         self.parent = parent
+        # Names defined dynamically (the global scope and built-ins)
         self.values: dict[str, RuntimeValue] = {}
+        # Function-local variables, indexed by the slots assigned by the resolver
+        self.slots: list[SlotValue] = [UNSET] * num_slots
+        # Set once a closure captures this environment, so it is never reused
+        self.escaped = False
+
+    def reset(self, parent: Optional["Environment"], num_slots: int) -> "Environment":
+        """Clear this environment so it can be reused for another call."""
+        self.parent = parent
+        self.values.clear()
+        self.slots = [UNSET] * num_slots
+        return self
+
+    def ancestor(self, depth: int) -> "Environment":
+        """Return the environment `depth` scopes up the parent chain."""
+        env = self
+        for _ in range(depth):
+            env = cast(Environment, env.parent)
+        return env
 
     def define(self, name: str, value: RuntimeValue) -> None:
         """Define a new variable in the current scope."""
-        self.values[name] = value
+        self.values[intern(name)] = value
 
     def get(self, name: str) -> RuntimeValue:
         """Get a variable value, searching parent scopes if needed."""
@@ -54,11 +79,33 @@ class Environment:
 class Function:
     """Represents a user-defined function."""
 
-    def __init__(self, name: str, parameters: list[str], body: Block, closure: Environment) -> None:
-        self.name = name
-        self.parameters = parameters
+    def __init__(
+        self,
+        name: str,
+        parameters: list[str],
+        body: Block,
+        closure: Environment,
+        num_slots: int,
+        jit_candidate: bool = False,
+        body_size: int = 0,
+        upvalues: tuple[tuple[Environment, int], ...] = (),
+    ) -> None:
+        self.name = intern(name)
+        self.parameters = [intern(param) for param in parameters]
         self.body = body
         self.closure = closure  # The environment where the function was defined
+        self.num_slots = num_slots  # Size of each call's environment
+        # (environment, slot) of each enclosing-function variable the body reads
+        self.upvalues = upvalues
+        # Numeric functions are compiled once their interpreted calls add up
+        # to enough work, estimated as the body size for each call
+        self.jit_candidate = jit_candidate
+        self.body_size = body_size
+        self.work = 0
+        self.compiled: Callable[..., float] | None = None
+        # The body's statements paired with the handlers of the interpreter
+        # that defined the function
+        self.prebound: list[tuple[Callable[..., RuntimeValue], ASTNode]] | None = None
 
     def __repr__(self) -> str:
         return f"<function {self.name}>"
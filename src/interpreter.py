@@ -3,27 +3,68 @@
 This module evaluates the AST and executes the program.
 """
 
+from collections.abc import Callable
+from typing import Any, cast
+
+from .analysis import mark_numeric_functions
 from .ast_nodes import (
+    GLOBAL,
+    AddOp,
     Assignment,
     ASTNode,
-    BinaryOp,
     Block,
     Boolean,
-    ExpressionStatement,
+    BuiltinCall,
+    Call0,
+    Call1,
+    Call2,
+    Call3,
+    DivOp,
+    EqOp,
     FunctionCall,
     FunctionDef,
+    GtOp,
     IfStatement,
+    LtOp,
+    MulOp,
+    NeqOp,
     Nil,
     Number,
+    NumpyReductionNode,
+    Outer,
     Program,
     ReturnStatement,
     String,
+    SubOp,
+    TailCall,
     UnaryOp,
+    Upvalue,
     VarDeclaration,
     Variable,
     WhileStatement,
 )
-from .environment import Environment, Function, ReturnException, RuntimeValue
+from .environment import UNSET, Environment, Function, RuntimeValue
+from .numba_codegen import NumbaCompiler, numba_available
+from .resolver import Resolver
+from .vectorize import iteration_count, numpy_available, run_reduction
+
+# Signature shared by all node handlers in the dispatch table
+Handler = Callable[[Any, Environment], RuntimeValue]
+
+# Work (calls times body size) a numeric function is interpreted for before
+# it is compiled with Numba. Importing Numba and compiling costs about as
+# much as interpreting a fifth of this, so only long-running functions are
+# compiled and typical short programs never pay for it.
+JIT_THRESHOLD = 5_000_000
+
+# Fewest iterations a reduction loop needs to run faster with NumPy; below
+# this, the fixed cost of setting up the arrays outweighs the loop itself
+MIN_VECTORIZED_ITERATIONS = 64
+
+# Reduction loop iterations interpreted before NumPy is first used. Importing
+# NumPy costs about as much as interpreting this many, so programs with only
+# a few short loops never pay for it.
+VECTORIZE_THRESHOLD = 30_000
 
 
 class Interpreter:
@@ -33,6 +74,71 @@ class Interpreter:
         self.global_env = Environment()
         self._setup_builtins()
 
+        # Set by a return statement; blocks and loops stop early while it is
+        # set, and the enclosing function call collects the value and clears it
+        self._returning = False
+        self._return_value: RuntimeValue = None
+        # Set instead of the return value when a function returns the result
+        # of a call to another user function
+        self._tail_call: tuple[Function, list[RuntimeValue]] | None = None
+
+        # Captured variables of the function whose body is running
+        self._upvalues: tuple[tuple[Environment, int], ...] = ()
+
+        # Call environments that can be reused by later calls
+        self._env_pool: list[Environment] = []
+
+        # Each block's statements paired with their handlers, keyed by id()
+        # since AST nodes aren't hashable. The AST may be run by other
+        # interpreters, so this lives here rather than on the nodes. The
+        # blocks are kept alive so that their ids can't be reused.
+        self._prebound: dict[int, list[tuple[Handler, ASTNode]]] = {}
+        self._prebound_blocks: list[Block] = []
+
+        # Created on first use, since importing Numba is slow
+        self._compiler: NumbaCompiler | None = None
+        # Cleared if Numba turns out not to be importable
+        self._jit_enabled = True
+
+        # Iterations of vectorizable reduction loops run so far, and whether
+        # NumPy can be used for them
+        self._reduction_work = 0
+        self._vectorize_enabled = True
+
+        # Handlers keyed by exact node type, so eval() is a single dict lookup
+        self._dispatch: dict[type[ASTNode], Handler] = {
+            Number: self._eval_literal,
+            String: self._eval_literal,
+            Boolean: self._eval_literal,
+            Nil: self._eval_nil,
+            Variable: self._eval_variable,
+            Upvalue: self._eval_upvalue,
+            AddOp: self._eval_add,
+            SubOp: self._eval_sub,
+            MulOp: self._eval_mul,
+            DivOp: self._eval_div,
+            LtOp: self._eval_lt,
+            GtOp: self._eval_gt,
+            EqOp: self._eval_eq,
+            NeqOp: self._eval_neq,
+            UnaryOp: self.eval_unary_op,
+            VarDeclaration: self._eval_var_declaration,
+            Assignment: self._eval_assignment,
+            Block: self.eval_block,
+            IfStatement: self.eval_if,
+            WhileStatement: self.eval_while,
+            NumpyReductionNode: self._eval_numpy_reduction,
+            ReturnStatement: self._eval_return,
+            FunctionDef: self._eval_function_def,
+            FunctionCall: self.eval_function_call,
+            Call0: self._eval_call0,
+            Call1: self._eval_call1,
+            Call2: self._eval_call2,
+            Call3: self._eval_call3,
+            TailCall: self._eval_tail_call,
+            BuiltinCall: self._eval_builtin_call,
+        }
+
     def _setup_builtins(self) -> None:
         """Define built-in functions."""
         self.global_env.define("print", self._builtin_print)
@@ -44,167 +150,274 @@ class Interpreter:
 
     def _value_to_string(self, value: RuntimeValue) -> str:
         """Convert a runtime value to a string representation."""
-        if value is None:
+        # Escape sequences were resolved when the string literal was parsed
+        if isinstance(value, str):
+            return value
+        elif value is None:
             return "nil"
-        elif isinstance(value, bool):
-            return "true" if value else "false"
+        elif value is True:
+            return "true"
+        elif value is False:
+            return "false"
         elif isinstance(value, float):
             # Display integers without decimal point
             if value.is_integer():
                 return str(int(value))
             return str(value)
-        elif isinstance(value, str):
-            # Handle escape sequences in strings
-            return value.encode().decode('unicode_escape')
         elif isinstance(value, Function):
             return repr(value)
         else:
             return str(value)
 
-    def _is_truthy(self, value: RuntimeValue) -> bool:
-        """Determine if a value is truthy."""
-        return not (value is None or value is False)
-
     def interpret(self, ast: Program) -> None:
         """Interpret a program."""
+        Resolver(self.global_env, vectorize=numpy_available()).resolve(ast)
+        if numba_available():
+            mark_numeric_functions(ast)
         self.eval_program(ast, self.global_env)
 
     def eval_program(self, node: Program, env: Environment) -> None:
         """Evaluate a program node."""
+        dispatch = self._dispatch
         for statement in node.statements:
-            self.eval(statement, env)
+            dispatch[type(statement)](statement, env)
+            if self._returning:
+                raise RuntimeError("Cannot return from top-level code")
 
     def eval(self, node: ASTNode, env: Environment) -> RuntimeValue:
         """Evaluate an AST node."""
-        if isinstance(node, (Number, String, Boolean)):
-            return node.value
-
-        elif isinstance(node, Nil):
-            return None
-
-        elif isinstance(node, Variable):
-            return env.get(node.name)
+        try:
+            handler = self._dispatch[type(node)]
+        except KeyError:
+            raise RuntimeError(f"Unknown node type: {type(node)}") from None
+        return handler(node, env)
 
-        elif isinstance(node, BinaryOp):
-            return self.eval_binary_op(node, env)
+    def _eval_literal(self, node: Number | String | Boolean, env: Environment) -> RuntimeValue:
+        """Evaluate a literal node."""
+        return node.value
 
-        elif isinstance(node, UnaryOp):
-            return self.eval_unary_op(node, env)
+    def _eval_nil(self, node: Nil, env: Environment) -> RuntimeValue:
+        """Evaluate a nil literal."""
+        return None
 
-        elif isinstance(node, VarDeclaration):
-            value = self.eval(node.value, env)
+    def _load_outer(self, name: str, outer: Outer, env: Environment) -> RuntimeValue:
+        """Read a name whose nearest declaration has not run yet.
+
+        Tries the declarations further out, then the globals, the same
+        order a scope-by-scope lookup of the name would.
+        """
+        for depth, slot in outer:
+            value = env.ancestor(depth).slots[slot]
+            if value is not UNSET:
+                return value
+        return self.global_env.get(name)
+
+    def _store_outer(self, name: str, outer: Outer, value: RuntimeValue, env: Environment) -> None:
+        """Assign to a name whose nearest declaration has not run yet."""
+        for depth, slot in outer:
+            target = env.ancestor(depth)
+            if target.slots[slot] is not UNSET:
+                target.slots[slot] = value
+                return
+        self.global_env.set(name, value)
+
+    def _load(
+        self, name: str, depth: int, slot: int, outer: Outer, env: Environment
+    ) -> RuntimeValue:
+        """Read a name from the slot the resolver assigned it, or from the globals."""
+        if depth == GLOBAL:
+            return self.global_env.get(name)
+        value = env.ancestor(depth).slots[slot]
+        if value is UNSET:
+            return self._load_outer(name, outer, env)
+        return value
+
+    def _store(self, node: Variable, value: RuntimeValue, env: Environment) -> None:
+        """Assign to an existing variable through its resolved location."""
+        if node.depth == GLOBAL:
+            self.global_env.set(node.name, value)
+            return
+        target = env.ancestor(node.depth)
+        if target.slots[node.slot] is UNSET:
+            self._store_outer(node.name, node.outer, value, env)
+            return
+        target.slots[node.slot] = value
+
+    def _eval_variable(self, node: Variable, env: Environment) -> RuntimeValue:
+        """Evaluate a variable reference."""
+        if node.depth == GLOBAL:
+            return self.global_env.get(node.name)
+        value = (env if node.depth == 0 else env.ancestor(node.depth)).slots[node.slot]
+        if value is UNSET:
+            return self._load_outer(node.name, node.outer, env)
+        return value
+
+    def _eval_upvalue(self, node: Upvalue, env: Environment) -> RuntimeValue:
+        """Evaluate a read of a variable captured from an enclosing function."""
+        target, slot = self._upvalues[node.index]
+        value = target.slots[slot]
+        if value is UNSET:
+            return self._load_outer(node.name, node.outer, env)
+        return value
+
+    def _eval_var_declaration(self, node: VarDeclaration, env: Environment) -> RuntimeValue:
+        """Evaluate a variable declaration."""
+        value = self.eval(node.value, env)
+        if node.slot == GLOBAL:
             env.define(node.name, value)
-            return None
+        else:
+            env.slots[node.slot] = value
+        return None
 
-        elif isinstance(node, Assignment):
-            value = self.eval(node.value, env)
-            env.set(node.name, value)
+    def _eval_assignment(self, node: Assignment, env: Environment) -> RuntimeValue:
+        """Evaluate an assignment to an existing variable."""
+        value = self.eval(node.value, env)
+        if node.depth == GLOBAL:
+            self.global_env.set(node.name, value)
             return None
-
-        elif isinstance(node, Block):
-            return self.eval_block(node, env)
-
-        elif isinstance(node, IfStatement):
-            return self.eval_if(node, env)
-
-        elif isinstance(node, WhileStatement):
-            return self.eval_while(node, env)
-
-        elif isinstance(node, ReturnStatement):
-            value = self.eval(node.value, env) if node.value else None
-            raise ReturnException(value)
-
-        elif isinstance(node, ExpressionStatement):
-            return self.eval(node.expression, env)
-
-        elif isinstance(node, FunctionDef):
-            func = Function(node.name, node.parameters, node.body, env)
-            env.define(node.name, func)
+        target = env.ancestor(node.depth)
+        if target.slots[node.slot] is UNSET:
+            self._store_outer(node.name, node.outer, value, env)
             return None
+        target.slots[node.slot] = value
+        return None
 
-        elif isinstance(node, FunctionCall):
-            return self.eval_function_call(node, env)
+    def _eval_return(self, node: ReturnStatement, env: Environment) -> RuntimeValue:
+        """Evaluate a return statement."""
+        self._return_value = self.eval(node.value, env) if node.value else None
+        self._returning = True
+        return None
 
+    def _eval_function_def(self, node: FunctionDef, env: Environment) -> RuntimeValue:
+        """Evaluate a function definition, capturing the current environment."""
+        upvalues = tuple((env.ancestor(depth), slot) for depth, slot in node.upvalues)
+        func = Function(
+            node.name,
+            node.parameters,
+            node.body,
+            env,
+            node.num_slots,
+            node.numeric and self._jit_enabled,
+            node.body_size,
+            upvalues,
+        )
+        func.prebound = self._prebind(node.body)
+        # The function keeps this environment alive, so it must not be pooled
+        env.escaped = True
+        if node.slot == GLOBAL:
+            env.define(node.name, func)
         else:
-            raise RuntimeError(f"Unknown node type: {type(node)}")
+            env.slots[node.slot] = func
+        return None
 
     def _check_numeric_operands(
         self, operator: str, left: RuntimeValue, right: RuntimeValue
     ) -> tuple[float, float]:
         """Verify operands are numeric and return them, or raise TypeError."""
-        if not isinstance(left, (int, float)) or not isinstance(right, (int, float)):
+        # All Toy numbers are floats. An exact type test is cheaper than
+        # isinstance and also rejects booleans, which are ints in Python.
+        if type(left) is not float or type(right) is not float:
             raise TypeError(f"Cannot {operator} {type(left).__name__} and {type(right).__name__}")
         return left, right
 
-    def eval_binary_op(self, node: BinaryOp, env: Environment) -> RuntimeValue:
-        """Evaluate a binary operation."""
+    def _eval_add(self, node: AddOp, env: Environment) -> RuntimeValue:
+        """Evaluate addition or string concatenation."""
         left = self.eval(node.left, env)
         right = self.eval(node.right, env)
+        if isinstance(left, str) or isinstance(right, str):
+            # String concatenation
+            return self._value_to_string(left) + self._value_to_string(right)
+        left_num, right_num = self._check_numeric_operands("add", left, right)
+        return left_num + right_num
+
+    def _eval_sub(self, node: SubOp, env: Environment) -> RuntimeValue:
+        """Evaluate subtraction."""
+        left = self.eval(node.left, env)
+        right = self.eval(node.right, env)
+        left_num, right_num = self._check_numeric_operands("subtract", left, right)
+        return left_num - right_num
 
-        if node.operator == "+":
-            if isinstance(left, str) or isinstance(right, str):
-                # String concatenation
-                return self._value_to_string(left) + self._value_to_string(right)
-            left_num, right_num = self._check_numeric_operands("add", left, right)
-            return left_num + right_num
-
-        elif node.operator == "-":
-            left_num, right_num = self._check_numeric_operands("subtract", left, right)
-            return left_num - right_num
-
-        elif node.operator == "*":
-            left_num, right_num = self._check_numeric_operands("multiply", left, right)
-            return left_num * right_num
-
-        elif node.operator == "/":
-            left_num, right_num = self._check_numeric_operands("divide", left, right)
-            if right_num == 0:
-                raise ZeroDivisionError("Division by zero")
-            return left_num / right_num
+    def _eval_mul(self, node: MulOp, env: Environment) -> RuntimeValue:
+        """Evaluate multiplication."""
+        left = self.eval(node.left, env)
+        right = self.eval(node.right, env)
+        left_num, right_num = self._check_numeric_operands("multiply", left, right)
+        return left_num * right_num
 
-        elif node.operator == "<":
-            left_num, right_num = self._check_numeric_operands("compare", left, right)
-            return left_num < right_num
+    def _eval_div(self, node: DivOp, env: Environment) -> RuntimeValue:
+        """Evaluate division."""
+        left = self.eval(node.left, env)
+        right = self.eval(node.right, env)
+        left_num, right_num = self._check_numeric_operands("divide", left, right)
+        if right_num == 0:
+            raise ZeroDivisionError("Division by zero")
+        return left_num / right_num
 
-        elif node.operator == ">":
-            left_num, right_num = self._check_numeric_operands("compare", left, right)
-            return left_num > right_num
+    def _eval_lt(self, node: LtOp, env: Environment) -> RuntimeValue:
+        """Evaluate a less-than comparison."""
+        left = self.eval(node.left, env)
+        right = self.eval(node.right, env)
+        left_num, right_num = self._check_numeric_operands("compare", left, right)
+        return left_num < right_num
 
-        elif node.operator == "==":
-            return left == right
+    def _eval_gt(self, node: GtOp, env: Environment) -> RuntimeValue:
+        """Evaluate a greater-than comparison."""
+        left = self.eval(node.left, env)
+        right = self.eval(node.right, env)
+        left_num, right_num = self._check_numeric_operands("compare", left, right)
+        return left_num > right_num
 
-        elif node.operator == "!=":
-            return left != right
+    def _eval_eq(self, node: EqOp, env: Environment) -> RuntimeValue:
+        """Evaluate an equality test."""
+        return self.eval(node.left, env) == self.eval(node.right, env)
 
-        else:
-            raise RuntimeError(f"Unknown binary operator: {node.operator}")
+    def _eval_neq(self, node: NeqOp, env: Environment) -> RuntimeValue:
+        """Evaluate an inequality test."""
+        return self.eval(node.left, env) != self.eval(node.right, env)
 
     def eval_unary_op(self, node: UnaryOp, env: Environment) -> RuntimeValue:
         """Evaluate a unary operation."""
         operand = self.eval(node.operand, env)
 
         if node.operator == "-":
-            if isinstance(operand, (int, float)):
+            if type(operand) is float:
                 return -operand
             else:
                 raise TypeError(f"Cannot negate {type(operand).__name__}")
         else:
             raise RuntimeError(f"Unknown unary operator: {node.operator}")
 
+    def _prebind(self, block: Block) -> list[tuple[Handler, ASTNode]]:
+        """Pair each statement of a block with its handler, once per block."""
+        prebound = self._prebound.get(id(block))
+        if prebound is None:
+            dispatch = self._dispatch
+            prebound = [(dispatch[type(statement)], statement) for statement in block.statements]
+            self._prebound[id(block)] = prebound
+            self._prebound_blocks.append(block)
+        return prebound
+
     def eval_block(self, node: Block, env: Environment) -> RuntimeValue:
         """Evaluate a block of statements."""
         # Blocks don't create new scopes - they use the current environment
         # (function calls and other constructs manage their own scopes)
+        # Handlers are looked up the first time the block runs, not per statement
+        prebound = self._prebound.get(id(node))
+        if prebound is None:
+            prebound = self._prebind(node)
         result: RuntimeValue = None
-        for statement in node.statements:
-            result = self.eval(statement, env)
+        for handler, statement in prebound:
+            result = handler(statement, env)
+            if self._returning:
+                return None
         return result
 
     def eval_if(self, node: IfStatement, env: Environment) -> RuntimeValue:
         """Evaluate an if statement."""
         condition = self.eval(node.condition, env)
 
-        if self._is_truthy(condition):
+        # Only nil and false are falsy
+        if condition is not None and condition is not False:
             return self.eval(node.then_block, env)
         elif node.else_block:
             return self.eval(node.else_block, env)
@@ -215,15 +428,67 @@ class Interpreter:
         """Evaluate a while loop."""
         while True:
             condition = self.eval(node.condition, env)
-            if not self._is_truthy(condition):
+            if condition is None or condition is False:
                 break
             self.eval(node.body, env)
+            if self._returning:
+                break
+
+        return None
 
+    def _eval_numpy_reduction(self, node: NumpyReductionNode, env: Environment) -> RuntimeValue:
+        """Evaluate a reduction loop with NumPy, or as a plain loop if it can't be."""
+        start = self._eval_variable(node.counter, env)
+        bound = self.eval(node.bound, env)
+        if type(start) is not float or type(bound) is not float:
+            return self.eval_while(node.loop, env)
+        count = iteration_count(start, bound, node.step)
+        if count is None:
+            return self.eval_while(node.loop, env)
+        if count == 0:
+            return None
+        if count < MIN_VECTORIZED_ITERATIONS or not self._vectorize_enabled:
+            return self.eval_while(node.loop, env)
+        self._reduction_work += count
+        if self._reduction_work < VECTORIZE_THRESHOLD:
+            return self.eval_while(node.loop, env)
+
+        acc = self._eval_variable(node.accumulator, env)
+        if type(acc) is not float:
+            return self.eval_while(node.loop, env)
+        try:
+            result = run_reduction(node, start, count, acc)
+        except ImportError:
+            # NumPy is installed but fails to import. Keep interpreting.
+            self._vectorize_enabled = False
+            return self.eval_while(node.loop, env)
+        self._store(node.counter, start + count * node.step, env)
+        self._store(node.accumulator, result, env)
         return None
 
+    def _jit_compile(self, func: Function) -> None:
+        """Compile a numeric function, falling back to interpretation on failure."""
+        func.jit_candidate = False
+        if not self._jit_enabled:
+            return
+        if self._compiler is None:
+            try:
+                self._compiler = NumbaCompiler()
+            except Exception:
+                # Numba is installed but fails to import, e.g. because it
+                # doesn't support the installed NumPy. Keep interpreting.
+                self._jit_enabled = False
+                return
+        func.compiled = self._compiler.compile(func)
+
+    def _eval_builtin_call(self, node: BuiltinCall, env: Environment) -> RuntimeValue:
+        """Evaluate a call the resolver bound directly to a built-in."""
+        args = [self.eval(arg, env) for arg in node.arguments]
+        return cast(RuntimeValue, node.func(*args))
+
     def eval_function_call(self, node: FunctionCall, env: Environment) -> RuntimeValue:
         """Evaluate a function call."""
-        func = env.get(node.name)
+        func = self._load(node.name, node.depth, node.slot, node.outer, env)
 
         # Evaluate arguments
         args = [self.eval(arg, env) for arg in node.arguments]
@@ -236,22 +501,147 @@ class Interpreter:
         if not isinstance(func, Function):
             raise TypeError(f"'{node.name}' is not a function")
 
-        # Check argument count
-        if len(args) != len(func.parameters):
-            raise TypeError(
-                f"{func.name}() takes {len(func.parameters)} arguments but {len(args)} were given"
-            )
+        return self._call_function(func, args)
 
-        # Create new environment for function execution
-        func_env = Environment(parent=func.closure)
+    # Calls with a fixed number of arguments evaluate them into locals and,
+    # for user functions, store them straight into the new environment's
+    # parameter slots
+    def _eval_call0(self, node: Call0, env: Environment) -> RuntimeValue:
+        """Evaluate a call with no arguments."""
+        func = self._load(node.name, node.depth, node.slot, node.outer, env)
+        if not isinstance(func, Function):
+            if callable(func):
+                return func()
+            raise TypeError(f"'{node.name}' is not a function")
+        return self._run(func, self._enter(func, 0))
 
-        # Bind parameters to arguments
-        for param, arg in zip(func.parameters, args, strict=True):
-            func_env.define(param, arg)
+    def _eval_call1(self, node: Call1, env: Environment) -> RuntimeValue:
+        """Evaluate a call with one argument."""
+        func = self._load(node.name, node.depth, node.slot, node.outer, env)
+        a0 = self.eval(node.arguments[0], env)
+        if not isinstance(func, Function):
+            if callable(func):
+                return func(a0)
+            raise TypeError(f"'{node.name}' is not a function")
+        func_env = self._enter(func, 1)
+        func_env.slots[0] = a0
+        return self._run(func, func_env)
+
+    def _eval_call2(self, node: Call2, env: Environment) -> RuntimeValue:
+        """Evaluate a call with two arguments."""
+        func = self._load(node.name, node.depth, node.slot, node.outer, env)
+        arguments = node.arguments
+        a0 = self.eval(arguments[0], env)
+        a1 = self.eval(arguments[1], env)
+        if not isinstance(func, Function):
+            if callable(func):
+                return func(a0, a1)
+            raise TypeError(f"'{node.name}' is not a function")
+        func_env = self._enter(func, 2)
+        slots = func_env.slots
+        slots[0] = a0
+        slots[1] = a1
+        return self._run(func, func_env)
+
+    def _eval_call3(self, node: Call3, env: Environment) -> RuntimeValue:
+        """Evaluate a call with three arguments."""
+        func = self._load(node.name, node.depth, node.slot, node.outer, env)
+        arguments = node.arguments
+        a0 = self.eval(arguments[0], env)
+        a1 = self.eval(arguments[1], env)
+        a2 = self.eval(arguments[2], env)
+        if not isinstance(func, Function):
+            if callable(func):
+                return func(a0, a1, a2)
+            raise TypeError(f"'{node.name}' is not a function")
+        func_env = self._enter(func, 3)
+        slots = func_env.slots
+        slots[0] = a0
+        slots[1] = a1
+        slots[2] = a2
+        return self._run(func, func_env)
+
+    def _eval_tail_call(self, node: TailCall, env: Environment) -> RuntimeValue:
+        """Evaluate a call whose result is returned directly.
+
+        Calls to user functions are handed back to the enclosing _run,
+        which runs them in place of the current call.
+        """
+        func = self._load(node.name, node.depth, node.slot, node.outer, env)
+        if not isinstance(func, Function):
+            return self.eval_function_call(node, env)
+        self._tail_call = (func, [self.eval(arg, env) for arg in node.arguments])
+        return None
 
-        # Execute function body
+    def _arity_error(self, func: Function, count: int) -> TypeError:
+        """Build the error for calling a function with the wrong number of arguments."""
+        return TypeError(
+            f"{func.name}() takes {len(func.parameters)} arguments but {count} were given"
+        )
+
+    def _enter(self, func: Function, count: int) -> Environment:
+        """Check the argument count of a call and get an environment for it.
+
+        Pooled environments are reused when there are any. The caller binds
+        the arguments to the parameter slots, which come first.
+        """
+        if count != len(func.parameters):
+            raise self._arity_error(func, count)
+        if self._env_pool:
+            return self._env_pool.pop().reset(func.closure, func.num_slots)
+        return Environment(parent=func.closure, num_slots=func.num_slots)
+
+    def _call_function(self, func: Function, args: list[RuntimeValue]) -> RuntimeValue:
+        """Run a user-defined function with a list of arguments."""
+        func_env = self._enter(func, len(args))
+        func_env.slots[: len(args)] = args
+        return self._run(func, func_env)
+
+    def _run(self, func: Function, func_env: Environment) -> RuntimeValue:
+        """Run a function whose arguments are bound in func_env, then any tail calls it makes."""
+        upvalues = self._upvalues
         try:
-            self.eval(func.body, func_env)
-            return None  # If no explicit return, return nil
-        except ReturnException as ret:
-            return ret.value
+            while True:
+                # Numeric functions run natively once they are hot
+                if func.compiled is not None:
+                    bound = func_env.slots[: len(func.parameters)]
+                    if all(type(arg) is float for arg in bound):
+                        return func.compiled(*bound)
+                if func.jit_candidate:
+                    func.work += func.body_size
+                    if func.work >= JIT_THRESHOLD:
+                        self._jit_compile(func)
+
+                # Upvalue nodes in the body index this function's captures
+                self._upvalues = func.upvalues
+
+                # Execute function body, stopping at a return
+                prebound = func.prebound
+                if prebound is None:
+                    prebound = func.prebound = self._prebind(func.body)
+                for handler, statement in prebound:
+                    handler(statement, func_env)
+                    if self._returning:
+                        break
+                if not self._returning:
+                    return None  # If no explicit return, return nil
+                self._returning = False
+
+                if self._tail_call is None:
+                    value, self._return_value = self._return_value, None
+                    return value
+                func, args = self._tail_call
+                self._tail_call = None
+
+                # Run the tail call in this environment unless a closure captured it
+                if func_env.escaped:
+                    func_env = self._enter(func, len(args))
+                else:
+                    if len(args) != len(func.parameters):
+                        raise self._arity_error(func, len(args))
+                    func_env.reset(func.closure, func.num_slots)
+                func_env.slots[: len(args)] = args
+        finally:
+            self._upvalues = upvalues
+            if not func_env.escaped:
+                self._env_pool.append(func_env)
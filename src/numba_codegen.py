@@ -0,0 +1,188 @@
+"""Native compilation of numeric Toy functions with Numba.
+
+Functions that the analysis pass marks as purely numeric are translated to
+equivalent Python source and compiled with ``numba.njit``. Numba is an
+optional dependency: it is imported the first time a function is compiled,
+and programs run entirely on the tree-walker when it is not installed.
+"""
+
+import importlib
+import importlib.util
+import sys
+from collections.abc import Callable
+from typing import Any
+
+from .ast_nodes import (
+    AddOp,
+    Assignment,
+    ASTNode,
+    BinaryOp,
+    Block,
+    DivOp,
+    EqOp,
+    FunctionCall,
+    GtOp,
+    IfStatement,
+    LtOp,
+    MulOp,
+    NeqOp,
+    Number,
+    NumpyReductionNode,
+    ReturnStatement,
+    SubOp,
+    TailCall,
+    UnaryOp,
+    VarDeclaration,
+    Variable,
+    WhileStatement,
+)
+from .environment import Function
+
+# Python operator for each binary node type, except division (see _checked_div)
+OPERATORS: dict[type[BinaryOp], str] = {
+    AddOp: "+",
+    SubOp: "-",
+    MulOp: "*",
+    LtOp: "<",
+    GtOp: ">",
+    EqOp: "==",
+    NeqOp: "!=",
+}
+
+
+def numba_available() -> bool:
+    """Check whether Numba can be imported, without importing it."""
+    return importlib.util.find_spec("numba") is not None
+
+
+def _checked_div(left: float, right: float) -> float:
+    """Divide with the interpreter's error for a zero divisor."""
+    if right == 0:
+        raise ZeroDivisionError("Division by zero")
+    return left / right
+
+
+class NumbaCompiler:
+    """Compiles numeric Toy functions to native code."""
+
+    def __init__(self) -> None:
+        self._numba: Any = importlib.import_module("numba")
+        self._helpers: dict[str, Any] = {"_checked_div": self._numba.njit(_checked_div)}
+        self._parameters: list[str] = []
+        self._loop_depth = 0
+
+    def compile(self, func: Function) -> Callable[..., float] | None:
+        """Compile a function, or return None if it can't be compiled.
+
+        The compiled function takes the same arguments as the Toy function,
+        all of which must be floats.
+        """
+        name = f"f_{func.name}"
+        params = ", ".join(f"v_{param}" for param in func.parameters)
+        lines = [
+            f"def {name}({params}{', ' if params else ''}_depth):",
+            # Native recursion has no depth limit of its own, so cap it at Python's
+            # recursion limit. This only stops runaway recursion: each interpreted
+            # Toy call takes several Python frames, so a compiled function can
+            # recurse deeper than the same function could when interpreted.
+            f"    if _depth > {sys.getrecursionlimit()}:",
+            '        raise RecursionError("maximum recursion depth exceeded")',
+            # Tail self-calls rebind the parameters and jump back here
+            "    while True:",
+        ]
+        self._parameters = [f"v_{param}" for param in func.parameters]
+        signature = f"float64({'float64, ' * len(func.parameters)}int64)"
+        # Any failure, in code generation or in Numba, leaves the function
+        # on the tree-walker
+        try:
+            self._loop_depth = 0
+            self._block(func.body, lines, 2)
+            namespace = dict(self._helpers)
+            exec("\n".join(lines), namespace)
+            native = self._numba.njit(signature)(namespace[name])
+        except Exception:
+            return None
+
+        def call(*args: float) -> float:
+            return float(native(*args, 0))
+
+        return call
+
+    def _block(self, block: Block, lines: list[str], depth: int) -> None:
+        """Emit the statements of a block at the given indentation depth."""
+        if not block.statements:
+            lines.append("    " * depth + "pass")
+        for statement in block.statements:
+            self._statement(statement, lines, depth)
+
+    def _statement(self, node: ASTNode, lines: list[str], depth: int) -> None:
+        """Emit one statement."""
+        indent = "    " * depth
+        if isinstance(node, (VarDeclaration, Assignment)):
+            lines.append(f"{indent}v_{node.name} = {self._expression(node.value)}")
+
+        elif (
+            isinstance(node, ReturnStatement)
+            and isinstance(node.value, TailCall)
+            and not self._loop_depth
+        ):
+            if self._parameters:
+                args = ", ".join(self._expression(argument) for argument in node.value.arguments)
+                lines.append(f"{indent}{', '.join(self._parameters)} = {args}")
+            lines.append(f"{indent}continue")
+
+        elif isinstance(node, ReturnStatement):
+            assert node.value is not None
+            lines.append(f"{indent}return {self._expression(node.value)}")
+
+        elif isinstance(node, Block):
+            self._block(node, lines, depth)
+
+        elif isinstance(node, IfStatement):
+            lines.append(f"{indent}if {self._expression(node.condition)}:")
+            self._block(node.then_block, lines, depth + 1)
+            if node.else_block:
+                lines.append(f"{indent}else:")
+                self._block(node.else_block, lines, depth + 1)
+
+        elif isinstance(node, NumpyReductionNode):
+            # Native code runs the loop as fast as NumPy would
+            self._statement(node.loop, lines, depth)
+
+        elif isinstance(node, WhileStatement):
+            lines.append(f"{indent}while {self._expression(node.condition)}:")
+            # A continue in here would restart this loop, so tail calls recurse
+            self._loop_depth += 1
+            self._block(node.body, lines, depth + 1)
+            self._loop_depth -= 1
+
+        else:
+            raise TypeError(f"Cannot compile {type(node).__name__}")
+
+    def _expression(self, node: ASTNode) -> str:
+        """Emit one expression."""
+        if isinstance(node, Number):
+            return repr(node.value)
+
+        elif isinstance(node, Variable):
+            return f"v_{node.name}"
+
+        elif isinstance(node, DivOp):
+            left, right = self._expression(node.left), self._expression(node.right)
+            if isinstance(node.right, Number) and node.right.value != 0:
+                return f"({left} / {right})"
+            return f"_checked_div({left}, {right})"
+
+        elif isinstance(node, BinaryOp):
+            operator = OPERATORS[type(node)]
+            return f"({self._expression(node.left)} {operator} {self._expression(node.right)})"
+
+        elif isinstance(node, UnaryOp):
+            return f"(-{self._expression(node.operand)})"
+
+        elif isinstance(node, FunctionCall):
+            args = "".join(f"{self._expression(argument)}, " for argument in node.arguments)
+            return f"f_{node.name}({args}_depth + 1)"
+
+        else:
+            raise TypeError(f"Cannot compile {type(node).__name__}")
@@ -0,0 +1,233 @@
+"""Static scope resolution for the Toy Language.
+
+Blocks share the scope they appear in, so function bodies are the only
+scopes besides the global one. This pass gives every name declared in a
+function (parameters, ``let`` and ``fn``) a fixed slot in that function's
+environment and annotates each reference with how many function scopes up
+the name was declared. A slot stays empty until its declaration runs, and
+until then references fall back to the declarations further out and then
+to the globals, just as looking the name up scope by scope would. Reads of
+a variable declared in an enclosing function become ``Upvalue`` references
+into a table that the function captures when it is defined. Names that are
+not declared in any enclosing function are left as ``GLOBAL`` and looked up
+by name at runtime, except calls to built-ins, which are bound to the
+built-in directly. Optionally, while loops that compute a reduction are
+replaced by a vectorized node.
+"""
+
+from collections.abc import Callable
+
+from .analysis import count_bindings, match_reduction
+from .ast_nodes import (
+    GLOBAL,
+    Assignment,
+    ASTNode,
+    BinaryOp,
+    Block,
+    BuiltinCall,
+    Call0,
+    Call1,
+    Call2,
+    Call3,
+    FunctionCall,
+    FunctionDef,
+    IfStatement,
+    NumpyReductionNode,
+    Outer,
+    Program,
+    ReturnStatement,
+    UnaryOp,
+    Upvalue,
+    VarDeclaration,
+    Variable,
+    WhileStatement,
+)
+from .environment import Environment, Function, RuntimeValue
+
+# Specialized call node for each argument count that has one
+FIXED_ARITY_CALLS: dict[int, type[FunctionCall]] = {0: Call0, 1: Call1, 2: Call2, 3: Call3}
+
+
+class Scope:
+    """Slot assignments for the names declared in one function body."""
+
+    def __init__(self, parameters: list[str]) -> None:
+        # Parameters occupy the first slots, in order, so arguments bind by position
+        self.slots: dict[str, int] = {name: i for i, name in enumerate(parameters)}
+        self.size = len(parameters)
+        # Index of each (depth, slot) from the defining scope that the body reads
+        self.upvalues: dict[tuple[int, int], int] = {}
+
+    def declare(self, name: str) -> None:
+        """Reserve a slot for a name unless it already has one."""
+        if name not in self.slots:
+            self.slots[name] = self.size
+            self.size += 1
+
+    def capture(self, depth: int, slot: int) -> int:
+        """Return the upvalue index for a variable of an enclosing function."""
+        return self.upvalues.setdefault((depth, slot), len(self.upvalues))
+
+
+class Resolver:
+    """Annotates variable references with (depth, slot) indices."""
+
+    def __init__(self, global_env: Environment, vectorize: bool = False) -> None:
+        self._global_env = global_env
+        # Whether to replace reduction loops with NumpyReductionNode
+        self._vectorize = vectorize
+        self._scopes: list[Scope] = []
+        self._builtins: dict[str, Callable[..., RuntimeValue]] = {}
+
+    def resolve(self, program: Program) -> None:
+        """Resolve all names in a program, mutating its nodes in place."""
+        # Calls to a built-in can be bound to it directly, unless the program
+        # could rebind that name somewhere
+        rebound = count_bindings(program.statements)
+        self._builtins = {
+            name: value
+            for name, value in self._global_env.values.items()
+            if callable(value) and not isinstance(value, Function) and name not in rebound
+        }
+        program.statements = [self._resolve(statement) for statement in program.statements]
+
+    def _lookup(self, name: str) -> tuple[int, int]:
+        """Find the (depth, slot) of a name, or (GLOBAL, GLOBAL) if it isn't local."""
+        for depth, scope in enumerate(reversed(self._scopes)):
+            if name in scope.slots:
+                return depth, scope.slots[name]
+        return GLOBAL, GLOBAL
+
+    def _outer(self, name: str, depth: int) -> Outer:
+        """Find the declarations of a name further out than the given depth."""
+        if depth == GLOBAL:
+            return ()
+        return tuple(
+            (outer_depth, scope.slots[name])
+            for outer_depth, scope in enumerate(reversed(self._scopes))
+            if outer_depth > depth and name in scope.slots
+        )
+
+    def _local_slot(self, name: str) -> int:
+        """Return the slot a declaration binds in the current scope."""
+        return self._scopes[-1].slots[name] if self._scopes else GLOBAL
+
+    def _declare_locals(self, statements: list[ASTNode], scope: Scope) -> None:
+        """Reserve slots for every declaration in a function body.
+
+        Declarations are hoisted so that a nested function can refer to a
+        variable its enclosing function declares after it. Before the
+        declaration runs, its slot is empty and lookups skip it.
+        """
+        for statement in statements:
+            if isinstance(statement, (VarDeclaration, FunctionDef)):
+                scope.declare(statement.name)
+            elif isinstance(statement, Block):
+                self._declare_locals(statement.statements, scope)
+            elif isinstance(statement, IfStatement):
+                self._declare_locals(statement.then_block.statements, scope)
+                if statement.else_block:
+                    self._declare_locals(statement.else_block.statements, scope)
+            elif isinstance(statement, WhileStatement):
+                self._declare_locals(statement.body.statements, scope)
+
+    def _resolve_block(self, block: Block) -> Block:
+        """Resolve each statement of a block in place."""
+        block.statements = [self._resolve(statement) for statement in block.statements]
+        return block
+
+    def _resolve(self, node: ASTNode) -> ASTNode:
+        """Resolve the names used by a node and its children.
+
+        Returns the node to use in its place, which is the node itself unless
+        it could be specialized.
+        """
+        if isinstance(node, Variable):
+            node.depth, node.slot = self._lookup(node.name)
+            node.outer = self._outer(node.name, node.depth)
+            if node.depth > 0:
+                # Depth 1 is the scope the function was defined in
+                index = self._scopes[-1].capture(node.depth - 1, node.slot)
+                return Upvalue(name=node.name, index=index, outer=node.outer)
+
+        elif isinstance(node, Upvalue):
+            # Left by an earlier resolution of this AST; its index belongs to
+            # a capture table that is being rebuilt
+            return self._resolve(Variable(name=node.name))
+
+        elif isinstance(node, BinaryOp):
+            node.left = self._resolve(node.left)
+            node.right = self._resolve(node.right)
+
+        elif isinstance(node, UnaryOp):
+            node.operand = self._resolve(node.operand)
+
+        elif isinstance(node, VarDeclaration):
+            node.value = self._resolve(node.value)
+            node.slot = self._local_slot(node.name)
+
+        elif isinstance(node, Assignment):
+            node.value = self._resolve(node.value)
+            node.depth, node.slot = self._lookup(node.name)
+            node.outer = self._outer(node.name, node.depth)
+
+        elif isinstance(node, Block):
+            return self._resolve_block(node)
+
+        elif isinstance(node, IfStatement):
+            node.condition = self._resolve(node.condition)
+            node.then_block = self._resolve_block(node.then_block)
+            if node.else_block:
+                node.else_block = self._resolve_block(node.else_block)
+
+        elif isinstance(node, WhileStatement):
+            node.condition = self._resolve(node.condition)
+            node.body = self._resolve_block(node.body)
+            if self._vectorize:
+                reduction = match_reduction(node)
+                if reduction is not None:
+                    return reduction
+
+        elif isinstance(node, NumpyReductionNode):
+            # Left by an earlier resolution of this AST; check the loop again,
+            # since this resolution may not vectorize
+            return self._resolve(node.loop)
+
+        elif isinstance(node, ReturnStatement):
+            if node.value:
+                node.value = self._resolve(node.value)
+
+        elif isinstance(node, FunctionDef):
+            node.slot = self._local_slot(node.name)
+            scope = Scope(node.parameters)
+            self._declare_locals(node.body.statements, scope)
+            self._scopes.append(scope)
+            self._resolve_block(node.body)
+            self._scopes.pop()
+            node.num_slots = scope.size
+            node.upvalues = list(scope.upvalues)
+
+        elif isinstance(node, FunctionCall):
+            node.depth, node.slot = self._lookup(node.name)
+            node.outer = self._outer(node.name, node.depth)
+            node.arguments = [self._resolve(argument) for argument in node.arguments]
+            if node.depth == GLOBAL and node.name in self._builtins:
+                return BuiltinCall(
+                    name=node.name, func=self._builtins[node.name], arguments=node.arguments
+                )
+            # Tail calls keep their own node type
+            if type(node) is FunctionCall and len(node.arguments) in FIXED_ARITY_CALLS:
+                return FIXED_ARITY_CALLS[len(node.arguments)](
+                    name=node.name,
+                    arguments=node.arguments,
+                    depth=node.depth,
+                    slot=node.slot,
+                    outer=node.outer,
+                )
+
+        elif isinstance(node, BuiltinCall):
+            # Left by an earlier resolution of this AST, possibly for another
+            # interpreter, so bind it again to this interpreter's built-in
+            return self._resolve(FunctionCall(name=node.name, arguments=node.arguments))
+
+        return node
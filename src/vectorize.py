@@ -0,0 +1,88 @@
+"""Vectorized execution of reduction loops with NumPy.
+
+Loops that analysis turns into a ``NumpyReductionNode`` compute each term
+for a whole chunk of counter values at once and fold the terms into the
+accumulator with a single ufunc call. Terms are combined strictly in
+order, so results match the interpreted loop bit for bit. NumPy is an
+optional dependency: it is imported on first use, and reduction loops run
+on the tree-walker when it is not installed.
+"""
+
+import importlib
+import importlib.util
+import math
+from fractions import Fraction
+from typing import Any
+
+from .analysis import EXACT_INTEGER_LIMIT
+from .ast_nodes import (
+    AddOp,
+    ASTNode,
+    DivOp,
+    MulOp,
+    Number,
+    NumpyReductionNode,
+    Reduction,
+    SubOp,
+    UnaryOp,
+    Variable,
+)
+
+# Counter values evaluated per NumPy call, which bounds the memory used
+CHUNK_SIZE = 1 << 16
+
+
+def numpy_available() -> bool:
+    """Check whether NumPy can be imported, without importing it."""
+    return importlib.util.find_spec("numpy") is not None
+
+
+def iteration_count(start: float, bound: float, step: float) -> int | None:
+    """Count the iterations of ``while (counter < bound)`` from ``start``.
+
+    Returns None unless every counter value is an exactly representable
+    integer, which is what makes the count exact.
+    """
+    if not start.is_integer() or abs(start) > EXACT_INTEGER_LIMIT:
+        return None
+    if not abs(bound) <= EXACT_INTEGER_LIMIT:  # Also rejects NaN
+        return None
+    if bound <= start:
+        return 0
+    return math.ceil((Fraction(bound) - int(start)) / int(step))
+
+
+def run_reduction(node: NumpyReductionNode, start: float, count: int, acc: float) -> float:
+    """Run ``count`` iterations of a reduction loop and return the accumulator."""
+    np: Any = importlib.import_module("numpy")
+    ufunc = np.add if node.reduction is Reduction.SUM else np.multiply
+    # The counter value the term sees on the first iteration
+    first = start + node.step if node.counter_first else start
+    # Overflow to inf and NaN are results here, as they are for Python floats
+    with np.errstate(all="ignore"):
+        for low in range(0, count, CHUNK_SIZE):
+            high = min(low + CHUNK_SIZE, count)
+            counters = first + np.arange(low, high, dtype=np.float64) * node.step
+            terms = np.broadcast_to(_evaluate(node.term, counters), counters.shape)
+            acc = float(ufunc.accumulate(np.concatenate(([acc], terms)))[-1])
+    return acc
+
+
+def _evaluate(node: ASTNode, counters: Any) -> Any:
+    """Evaluate a term over an array of counter values."""
+    if isinstance(node, Number):
+        return node.value
+    elif isinstance(node, Variable):
+        return counters
+    elif isinstance(node, AddOp):
+        return _evaluate(node.left, counters) + _evaluate(node.right, counters)
+    elif isinstance(node, SubOp):
+        return _evaluate(node.left, counters) - _evaluate(node.right, counters)
+    elif isinstance(node, MulOp):
+        return _evaluate(node.left, counters) * _evaluate(node.right, counters)
+    elif isinstance(node, DivOp):
+        return _evaluate(node.left, counters) / _evaluate(node.right, counters)
+    elif isinstance(node, UnaryOp):
+        return -_evaluate(node.operand, counters)
+    else:
+        raise TypeError(f"Cannot vectorize {type(node).__name__}")